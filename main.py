@@ -11,70 +11,163 @@ EXO Language v3.1 - Production Ready Edition
 
 import os
 import sys
+import functools
 import json
 import math
 import random
+import re
 import time
 import socket
+import threading
 import traceback
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 from pathlib import Path
+from typing import Any, ClassVar, Dict, Iterator, List, NoReturn, Optional, Sequence, Tuple
+
+# Token and AST node shapes used by the parser and evaluator
+Token = Tuple[str, Any]
+Node = Tuple[Any, ...]
 
 # ==================== SCOPE MANAGEMENT ====================
+# Marks a function slot whose variable has not been assigned yet
+UNSET = object()
+
 class Scope:
     """Manages variable scoping with proper parent chain"""
-    def __init__(self, parent=None, name="global"):
+    __slots__ = ('parent', 'name', 'vars', 'layout', 'slots')
+
+    def __init__(self, parent: Optional['Scope'] = None, name: str = "global",
+                 layout: Optional[Dict[str, int]] = None) -> None:
         self.parent = parent
         self.name = name
-        self.vars = {}
+        self.vars: Dict[str, Any] = {}
+        # Function frames keep their locals in slots laid out by CompileScope
+        self.layout = layout if layout is not None else {}
+        self.slots: List[Any] = [UNSET] * len(self.layout)
     
-    def get(self, name):
+    def get(self, name: str) -> Any:
         """Get variable value from current or parent scope"""
-        if name in self.vars:
-            return self.vars[name]
-        if self.parent:
-            return self.parent.get(name)
+        scope: Optional[Scope] = self
+        while scope is not None:
+            values = scope.vars
+            if name in values:
+                return values[name]
+            slot = scope.layout.get(name)
+            if slot is not None:
+                value = scope.slots[slot]
+                if value is not UNSET:
+                    return value
+            scope = scope.parent
         raise KeyError(f"Variable '{name}' not defined")
     
-    def set(self, name, value, local=True):
-        """Set variable in current or parent scope"""
-        if local or name not in self.get_all_names():
-            self.vars[name] = value
+    def set(self, name: str, value: Any) -> None:
+        """Set variable in current scope"""
+        slot = self.layout.get(name)
+        if slot is not None:
+            self.slots[slot] = value
         else:
-            scope = self
-            while scope:
-                if name in scope.vars:
-                    scope.vars[name] = value
-                    return
-                scope = scope.parent
             self.vars[name] = value
     
-    def exists(self, name):
-        """Check if variable exists in current or parent scope"""
-        if name in self.vars:
-            return True
-        if self.parent:
-            return self.parent.exists(name)
-        return False
-    
-    def get_all_names(self):
-        """Get all variable names in scope chain"""
-        names = set(self.vars.keys())
-        if self.parent:
-            names.update(self.parent.get_all_names())
-        return names
+    def owner(self, name: str) -> Optional['Scope']:
+        """Return the nearest scope that binds name, or None"""
+        scope: Optional[Scope] = self
+        while scope is not None:
+            if name in scope.vars:
+                return scope
+            slot = scope.layout.get(name)
+            if slot is not None and scope.slots[slot] is not UNSET:
+                return scope
+            scope = scope.parent
+        return None
+
+class CompileScope:
+    """Compile-time map of a function's local names to frame slot indices"""
+    def __init__(self, parent: Optional['CompileScope'] = None) -> None:
+        self.parent = parent
+        self.slots: Dict[str, int] = {}
+        # Set when the body defines functions, which capture its frame
+        self.closures = False
+    
+    def declare(self, name: str) -> int:
+        """Return the slot for a local name, allocating one if needed"""
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.slots)
+        return slot
+    
+    def resolve(self, name: str) -> Optional[Tuple[int, int]]:
+        """Return (depth, slot) of an enclosing function local, or None"""
+        depth = 0
+        scope: Optional[CompileScope] = self
+        while scope is not None:
+            slot = scope.slots.get(name)
+            if slot is not None:
+                return depth, slot
+            scope = scope.parent
+            depth += 1
+        return None
 
 # ==================== GLOBAL STATE ====================
 global_scope = Scope(name="global")
-current_scope = global_scope
-functions = {}
-modules = {}
-output = []
-web_routes = {}
-call_stack = []
+functions: Dict[str, Tuple[Any, ...]] = {}
+modules: Dict[str, Dict[str, Any]] = {}
+output: List[str] = []
+web_routes: Dict[str, Any] = {}
+# Per-thread interpreter state, so threaded web requests keep their own
+# call stacks; call_stack holds (name, args) per active call, formatted
+# only when an error shows it
+thread_state = threading.local()
+
+def get_call_stack() -> List[Tuple[str, List[Any]]]:
+    """Return the calling thread's stack of active EXO function calls"""
+    try:
+        return thread_state.call_stack
+    except AttributeError:
+        stack: List[Tuple[str, List[Any]]] = []
+        thread_state.call_stack = stack
+        return stack
+
 MAX_RECURSION_DEPTH = 1000
 
+# Each EXO call runs through several Python frames (exec_block, the statement
+# handler, eval_ast for each enclosing expression, call_user_function), and
+# more inside nested blocks, so Python's own limit has to leave room for
+# MAX_RECURSION_DEPTH calls
+PY_FRAMES_PER_CALL = 16
+sys.setrecursionlimit(max(sys.getrecursionlimit(), MAX_RECURSION_DEPTH * PY_FRAMES_PER_CALL))
+
+# Released frames each function definition keeps for reuse; a deep recursion
+# allocates past this and the extra frames are dropped as it unwinds
+FRAME_POOL_SIZE = 64
+
+# ==================== KEYWORDS ====================
+# Statement keywords, matched against the first word of a line
+VAR_KEYWORDS = frozenset(['let', 'متغير', 'var', 'const'])
+RETURN_KEYWORDS = frozenset(['return', 'ارجع'])
+ROUTE_KEYWORDS = frozenset(['route', 'مسار'])
+FUNC_KEYWORDS = frozenset(['func', 'دالة', 'function'])
+IF_KEYWORDS = frozenset(['if', 'اذا'])
+WHILE_KEYWORDS = frozenset(['while', 'بينما'])
+FOR_KEYWORDS = frozenset(['for', 'لكل'])
+BREAK_KEYWORDS = frozenset(['break', 'اكسر'])
+CONTINUE_KEYWORDS = frozenset(['continue', 'استمر'])
+ELSE_KEYWORDS = frozenset(['else', 'والا'])
+END_KEYWORDS = frozenset(['end', 'نهاية'])
+
+# Words that open a block closed by 'end' / 'نهاية'
+BLOCK_OPENERS = IF_KEYWORDS | WHILE_KEYWORDS | FOR_KEYWORDS | FUNC_KEYWORDS | ROUTE_KEYWORDS
+
+def opens_block(line):
+    """Check whether a stripped line starts a block closed by 'end'"""
+    first, sep, _ = line.partition(' ')
+    return bool(sep) and first in BLOCK_OPENERS
+
+FOR_SEPARATORS = (' in ', ' في ')
+
+# Annotation line placed before `func` to cache results per argument tuple
+MEMO_MARKERS = frozenset(['@memo', '@محفوظ'])
+
 # ==================== ERROR HANDLING ====================
 class ExoError(Exception):
     """Enhanced error with context information"""
@@ -98,714 +191,924 @@ class ExoError(Exception):
             parts.append(f"\n\n📝 Context:")
             parts.append(f"   {self.context}")
         
+        call_stack = get_call_stack()
         if call_stack:
             parts.append(f"\n\n📚 Call Stack:")
-            for i, frame in enumerate(reversed(call_stack[-5:])):
-                parts.append(f"   {i+1}. {frame}")
+            for i, (name, args) in enumerate(reversed(call_stack[-5:])):
+                parts.append(f"   {i+1}. {name}({', '.join(str(a)[:20] for a in args)})")
         
         return "".join(parts)
 
-def error(msg, line=None, file=None, context=None):
+def error(msg: str, line: Optional[int] = None, file: Optional[str] = None,
+          context: Optional[str] = None) -> NoReturn:
     """Raise EXO error"""
     raise ExoError(msg, line, file, context)
 
 # ==================== STRING UTILITIES ====================
-def parse_string(s):
-    """Parse escape sequences in strings"""
-    return (s.replace('\\n', '\n')
-            .replace('\\t', '\t')
-            .replace('\\r', '\r')
-            .replace('\\"', '"')
-            .replace("\\'", "'")
-            .replace('\\\\', '\\'))
-
-def is_number(s):
-    """Check if string represents a number"""
-    try:
-        float(s)
-        return True
-    except:
-        return False
+# Backslash escapes understood inside string literals
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', "'": "'", '\\': '\\'}
+ESCAPE_RE = re.compile(r'\\([ntr"\'\\])')
 
-# ==================== EXPRESSION PARSING ====================
-def split_by_op(expr, op):
-    """Split expression by operator respecting strings and brackets"""
-    parts = []
-    current = ""
-    depth = 0
-    in_string = False
-    string_char = None
-    i = 0
-    
-    while i < len(expr):
+def _unescape(m: 're.Match[str]') -> str:
+    return ESCAPES[m.group(1)]
+
+def parse_string(s: str) -> str:
+    """Parse escape sequences in strings in a single pass"""
+    if '\\' not in s:
+        return s
+    return ESCAPE_RE.sub(_unescape, s)
+
+# ==================== TOKENIZER ====================
+# Word operators (English/Arabic) mapped to their canonical spelling
+WORD_OPS = {
+    'or': 'or', 'او': 'or',
+    'and': 'and', 'و': 'and',
+    'not': 'not', 'ليس': 'not',
+}
+
+SYMBOL_OPS = {'||': 'or', '&&': 'and', '!': 'not'}
+TWO_CHAR_OPS = ('==', '!=', '>=', '<=', '||', '&&')
+ONE_CHAR_OPS = '+-*/%^<>!'
+
+PUNCTUATION = {
+    '(': 'LPAREN', ')': 'RPAREN',
+    '[': 'LBRACK', ']': 'RBRACK',
+    '{': 'LBRACE', '}': 'RBRACE',
+    ',': 'COMMA', ':': 'COLON', '.': 'DOT',
+}
+
+# Tokens after which a '.' is property access rather than a number
+VALUE_END_TOKENS = ('NUM', 'STR', 'IDENT', 'RPAREN', 'RBRACK', 'RBRACE')
+
+# Literal strings with backslash escapes, matched from their opening quote
+STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'', re.S)
+WORD_RE = re.compile(r'\w+')
+NAME_RE = re.compile(r'[^\W\d]\w*')
+# The literals int()/float() read: digit underscores, and a trailing dot or
+# an exponent once there is a decimal point
+NUMBER_RE = re.compile(
+    r'(?:\d(?:_?\d)*\.(?:\d(?:_?\d)*)?|\.\d(?:_?\d)*)(?:[eE][-+]?\d(?:_?\d)*)?'
+    r'|\d(?:_?\d)*')
+
+# Lexeme class of each ASCII character, so tokenize branches on a single
+# dict lookup; other characters (Arabic letters and digits) are classified
+# with str methods
+CHAR_KINDS: Dict[str, str] = {
+    **dict.fromkeys(' \t\r\n', 'space'),
+    **dict.fromkeys('#', 'comment'),
+    **dict.fromkeys('"\'', 'string'),
+    **dict.fromkeys('0123456789', 'number'),
+    **dict.fromkeys(ONE_CHAR_OPS + '=|&', 'op'),
+    **dict.fromkeys(PUNCTUATION, 'punct'),
+    **dict.fromkeys('_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ', 'word'),
+}
+
+def tokenize(expr: str, ln: Optional[int] = None, file: Optional[str] = None) -> List[Token]:
+    """Split an expression into (kind, value) tokens in a single pass"""
+    tokens: List[Token] = []
+    i: int = 0
+    n: int = len(expr)
+
+    while i < n:
         char = expr[i]
-        
-        # Handle string delimiters
-        if char in ('"', "'") and (i == 0 or expr[i-1] != '\\'):
-            if not in_string:
-                in_string = True
-                string_char = char
-            elif char == string_char:
-                in_string = False
-            current += char
-            i += 1
+        kind = CHAR_KINDS.get(char)
+        if kind is None:
+            kind = ('word' if char.isalpha() else 'number' if char.isdigit()
+                    else 'space' if char.isspace() else 'other')
+
+        # Identifiers and word operators
+        if kind == 'word':
+            m = WORD_RE.match(expr, i)
+            if m is None:
+                error(f"Unexpected character '{char}'", ln, file, expr)
+            j = m.end()
+            # \w stops at combining marks (Arabic harakat) that names may hold
+            while j < n and expr[j] not in CHAR_KINDS and ('_' + expr[j]).isidentifier():
+                m = WORD_RE.match(expr, j + 1)
+                j = m.end() if m is not None else j + 1
+            word = expr[i:j]
+            if word in WORD_OPS:
+                tokens.append(('OP', WORD_OPS[word]))
+            else:
+                # Interned so scope and function lookups match by identity
+                tokens.append(('IDENT', sys.intern(word)))
+            i = j
             continue
-        
-        # Skip if inside string
-        if in_string:
-            current += char
+
+        # A '.' followed by digits starts a number unless it follows a value
+        if kind == 'punct' and not (char == '.' and i + 1 < n and expr[i+1].isdigit()
+                                    and (not tokens or tokens[-1][0] not in VALUE_END_TOKENS)):
+            tokens.append((PUNCTUATION[char], char))
             i += 1
             continue
-        
-        # Track bracket depth
-        if char in '([{':
-            depth += 1
-        elif char in ')]}':
-            depth -= 1
-        
-        # Split at operator if at depth 0
-        if depth == 0 and expr[i:i+len(op)] == op:
-            if current.strip():
-                parts.append(current.strip())
-            current = ""
-            i += len(op)
-        else:
-            current += char
+
+        if kind == 'space':
             i += 1
-    
-    if current.strip():
-        parts.append(current.strip())
-    
-    return parts if len(parts) > 1 else [expr]
+            continue
 
-# ==================== ARITHMETIC EVALUATION ====================
-def eval_arith(expr, ln=None, file=None):
-    """Evaluate arithmetic and logical expressions"""
-    expr = expr.strip()
-    
-    # Remove outer parentheses if they wrap entire expression
-    while expr.startswith('(') and expr.endswith(')'):
-        depth = 0
-        valid = True
-        for i, c in enumerate(expr):
-            if c == '(':
-                depth += 1
-            elif c == ')':
-                depth -= 1
-            if depth == 0 and i < len(expr) - 1:
-                valid = False
-                break
-        if valid:
-            expr = expr[1:-1].strip()
-        else:
+        # Operators
+        if kind == 'op':
+            pair = expr[i:i+2]
+            if pair in TWO_CHAR_OPS:
+                tokens.append(('OP', SYMBOL_OPS.get(pair, pair)))
+                i += 2
+                continue
+            if char in ONE_CHAR_OPS:
+                tokens.append(('OP', SYMBOL_OPS.get(char, char)))
+                i += 1
+                continue
+
+        # Number literals
+        elif kind == 'number' or kind == 'punct':
+            m = NUMBER_RE.match(expr, i)
+            if m is None:
+                error(f"Unexpected character '{char}'", ln, file, expr)
+            j = m.end()
+            text = expr[i:j]
+            tokens.append(('NUM', float(text) if '.' in text else int(text)))
+            i = j
+            continue
+
+        # String literals
+        elif kind == 'string':
+            m = STRING_RE.match(expr, i)
+            if m is None:
+                error("Unterminated string", ln, file, expr)
+            j = m.end()
+            tokens.append(('STR', parse_string(expr[i+1:j-1])))
+            i = j
+            continue
+
+        # Comment runs to the end of the expression
+        elif kind == 'comment':
             break
-    
-    # Logical OR
-    for sep in [' or ', ' او ', ' || ']:
-        parts = split_by_op(expr, sep)
-        if len(parts) > 1:
-            return any(eval_arith(p, ln, file) for p in parts)
-    
-    # Logical AND
-    for sep in [' and ', ' و ', ' && ']:
-        parts = split_by_op(expr, sep)
-        if len(parts) > 1:
-            return all(eval_arith(p, ln, file) for p in parts)
-    
-    # Logical NOT
-    if expr.startswith(('not ', 'ليس ', '!')):
-        if expr.startswith('not '):
-            rest = expr[4:]
-        elif expr.startswith('ليس '):
-            rest = expr[5:]
-        else:
-            rest = expr[1:]
-        return not eval_arith(rest.strip(), ln, file)
-    
-    # Comparison operators
-    ops = {
-        '==': lambda a, b: a == b,
-        '!=': lambda a, b: a != b,
-        '>=': lambda a, b: a >= b,
-        '<=': lambda a, b: a <= b,
-        '>': lambda a, b: a > b,
-        '<': lambda a, b: a < b
-    }
-    
-    for op in ['==', '!=', '>=', '<=', '>', '<']:
-        parts = split_by_op(expr, op)
-        if len(parts) == 2:
-            left = eval_arith(parts[0], ln, file)
-            right = eval_arith(parts[1], ln, file)
-            return ops[op](left, right)
-    
-    # Addition and subtraction
-    for op in ['+', '-']:
-        parts = split_by_op(expr, op)
-        if len(parts) > 1:
-            result = eval_arith(parts[0], ln, file)
-            for i in range(1, len(parts)):
-                val = eval_arith(parts[i], ln, file)
-                result = result + val if op == '+' else result - val
-            return result
-    
-    # Multiplication, division, modulo
-    for op in ['*', '/', '%']:
-        parts = split_by_op(expr, op)
-        if len(parts) > 1:
-            result = eval_arith(parts[0], ln, file)
-            for i in range(1, len(parts)):
-                val = eval_arith(parts[i], ln, file)
-                if op == '*':
-                    result *= val
-                elif op == '/':
-                    if val == 0:
-                        error("Division by zero", ln, file, expr)
-                    result /= val
-                else:
-                    result %= val
-            return result
-    
-    # Power operator
-    if '^' in expr:
-        parts = split_by_op(expr, '^')
-        if len(parts) > 1:
-            result = eval_arith(parts[-1], ln, file)
-            for i in range(len(parts) - 2, -1, -1):
-                result = eval_arith(parts[i], ln, file) ** result
-            return result
-    
-    return eval_base(expr, ln, file)
 
-# ==================== BASE VALUE EVALUATION ====================
-def eval_base(expr, ln=None, file=None):
-    """Evaluate base values (literals, variables, function calls)"""
-    expr = expr.strip()
-    if not expr:
-        return None
-    
-    # Boolean literals
-    if expr in ("True", "صح", "true"):
-        return True
-    if expr in ("False", "خطأ", "false"):
-        return False
-    if expr in ("null", "فارغ", "None"):
-        return None
-    
-    # String literals
-    if (expr.startswith('"') and expr.endswith('"')) or \
-       (expr.startswith("'") and expr.endswith("'")):
-        return parse_string(expr[1:-1])
-    
-    # Array literals
-    if expr.startswith('[') and expr.endswith(']'):
-        inner = expr[1:-1].strip()
-        if not inner:
-            return []
-        
-        items = []
-        depth = 0
-        current = ""
-        in_string = False
-        string_char = None
-        
-        for char in inner + ',':
-            if char in ('"', "'") and (not current or current[-1] != '\\'):
-                if not in_string:
-                    in_string = True
-                    string_char = char
-                elif char == string_char:
-                    in_string = False
-            
-            if not in_string:
-                if char in '[{(':
-                    depth += 1
-                elif char in ']})':
-                    depth -= 1
-                
-                if char == ',' and depth == 0:
-                    if current.strip():
-                        items.append(evaluate(current.strip(), ln, file))
-                    current = ""
-                    continue
-            
-            current += char
-        
+        error(f"Unexpected character '{char}'", ln, file, expr)
+
+    return tokens
+
+# ==================== EXPRESSION PARSING ====================
+# Binding powers follow the old precedence order:
+# or < and < not < comparisons < +/- < */% < unary minus < ^
+# Negative number literals are parsed as a single operand beneath all of them.
+# Left-associative operators bind their right side one step tighter.
+INFIX_BP = {
+    'or': (10, 11),
+    'and': (20, 21),
+    '==': (30, 31), '!=': (30, 31),
+    '>=': (30, 31), '<=': (30, 31),
+    '>': (30, 31), '<': (30, 31),
+    '+': (40, 41), '-': (40, 41),
+    '*': (50, 51), '/': (50, 51), '%': (50, 51),
+    '^': (60, 60),
+}
+
+PREFIX_BP = {'not': 25, '-': 55, '+': 55}
+
+LITERALS = {
+    'True': True, 'صح': True, 'true': True,
+    'False': False, 'خطأ': False, 'false': False,
+    'null': None, 'فارغ': None, 'None': None,
+}
+
+END_TOKEN = ('END', None)
+
+class Parser:
+    """Pratt parser turning a token list into tuple AST nodes"""
+    def __init__(self, tokens: List[Token], expr: str,
+                 ln: Optional[int] = None, file: Optional[str] = None) -> None:
+        self.tokens: List[Token] = tokens
+        self.pos: int = 0
+        self.expr: str = expr
+        self.ln: Optional[int] = ln
+        self.file: Optional[str] = file
+
+    def peek(self) -> Token:
+        """Return the next token without consuming it"""
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return END_TOKEN
+
+    def advance(self) -> Token:
+        """Consume and return the next token"""
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, kind: str) -> Token:
+        """Consume a token of the given kind or fail"""
+        token = self.advance()
+        if token[0] != kind:
+            self.fail()
+        return token
+
+    def fail(self) -> NoReturn:
+        error(f"Invalid expression: {self.expr}", self.ln, self.file, self.expr)
+
+    def parse_sequence(self, closer: str) -> List[Node]:
+        """Parse comma-separated expressions up to the closing token"""
+        items: List[Node] = []
+        while self.peek()[0] != closer:
+            items.append(self.parse_expr())
+            if self.peek()[0] == 'COMMA':
+                self.advance()
+            elif self.peek()[0] != closer:
+                self.fail()
+        self.advance()
         return items
-    
-    # Object literals
-    if expr.startswith('{') and expr.endswith('}'):
-        inner = expr[1:-1].strip()
-        if not inner:
-            return {}
-        
-        obj = {}
-        pairs = []
-        depth = 0
-        current = ""
-        in_string = False
-        string_char = None
-        
-        for char in inner + ',':
-            if char in ('"', "'") and (not current or current[-1] != '\\'):
-                if not in_string:
-                    in_string = True
-                    string_char = char
-                elif char == string_char:
-                    in_string = False
-            
-            if not in_string:
-                if char in '[{(':
-                    depth += 1
-                elif char in ']})':
-                    depth -= 1
-                
-                if char == ',' and depth == 0:
-                    if current.strip():
-                        pairs.append(current.strip())
-                    current = ""
-                    continue
-            
-            current += char
-        
-        for pair in pairs:
-            if ':' not in pair:
+
+    def parse_prefix(self) -> Node:
+        """Parse literals, names, calls, groups and prefix operators"""
+        kind, value = self.advance()
+
+        if kind in ('NUM', 'STR'):
+            return ('const', value)
+
+        if kind == 'IDENT':
+            if value in LITERALS:
+                return ('const', LITERALS[value])
+            if self.peek()[0] == 'LPAREN':
+                self.advance()
+                args = self.parse_sequence('RPAREN')
+                # Builtins cannot be shadowed, so bind their handler now
+                handler = BUILTIN_DISPATCH.get(value)
+                if handler is not None:
+                    return ('builtin', handler, args)
+                return ('call', value, args)
+            return ('var', value)
+
+        # Groups opened back to back are closed in a loop, so '((((x))))'
+        # takes one parse_expr call instead of one per level
+        if kind == 'LPAREN':
+            depth = 1
+            while self.peek()[0] == 'LPAREN':
+                self.advance()
+                depth += 1
+            node = self.parse_expr()
+            self.expect('RPAREN')
+            for _ in range(depth - 1):
+                node = self.parse_infix(node)
+                self.expect('RPAREN')
+            return node
+
+        if kind == 'LBRACK':
+            return ('list', self.parse_sequence('RBRACK'))
+
+        if kind == 'LBRACE':
+            pairs: List[Tuple[Node, Node]] = []
+            while self.peek()[0] != 'RBRACE':
+                key = self.parse_expr()
+                self.expect('COLON')
+                pairs.append((key, self.parse_expr()))
+                if self.peek()[0] == 'COMMA':
+                    self.advance()
+                elif self.peek()[0] != 'RBRACE':
+                    self.fail()
+            self.advance()
+            return ('dict', pairs)
+
+        if kind == 'OP' and value in PREFIX_BP:
+            # A negative number literal is one operand, so -2 ^ 2 is 4
+            if value == '-' and self.peek()[0] == 'NUM':
+                return ('const', -self.advance()[1])
+            operand = self.parse_expr(PREFIX_BP[value])
+            if value == 'not':
+                return fold_constants(('not', operand))
+            if value == '-':
+                return fold_constants(('neg', operand))
+            return operand
+
+        self.fail()
+
+    def parse_expr(self, min_bp: int = 0) -> Node:
+        """Parse an expression whose operators bind at least min_bp"""
+        return self.parse_infix(self.parse_prefix(), min_bp)
+
+    def parse_infix(self, left: Node, min_bp: int = 0) -> Node:
+        """Extend left with postfix and infix operators binding at least min_bp"""
+        while True:
+            kind, value = self.peek()
+
+            # Postfix indexing and property access bind tightest
+            if kind == 'LBRACK':
+                self.advance()
+                index = self.parse_expr()
+                self.expect('RBRACK')
+                left = ('index', left, index)
                 continue
-            kp, vp = pair.split(':', 1)
-            key = evaluate(kp.strip(), ln, file)
-            value = evaluate(vp.strip(), ln, file)
-            obj[key] = value
-        
-        return obj
-    
-    # Function calls
-    if '(' in expr and expr.endswith(')'):
-        pp = expr.find('(')
-        fn = expr[:pp].strip()
-        args_str = expr[pp+1:-1].strip()
-        
-        if fn and (fn in get_builtin_functions() or fn in functions or fn.isidentifier()):
-            return call_function(fn, args_str, ln, file)
-    
-    # Array/object indexing
-    if '[' in expr and ']' in expr:
-        bp = expr.find('[')
-        vn = expr[:bp].strip()
-        idx_expr = expr[bp+1:expr.rfind(']')]
-        
-        try:
-            var = current_scope.get(vn)
-            idx = evaluate(idx_expr, ln, file)
-            return var[idx]
-        except KeyError:
-            error(f"Variable '{vn}' not defined", ln, file, expr)
-        except (IndexError, KeyError):
-            error(f"Invalid index: {idx}", ln, file, expr)
-    
-    # Property access
-    if '.' in expr and not is_number(expr):
-        parts = expr.split('.')
-        try:
-            obj = current_scope.get(parts[0])
-            for part in parts[1:]:
-                if isinstance(obj, dict):
-                    if part not in obj:
-                        error(f"Key '{part}' not found", ln, file, expr)
-                    obj = obj[part]
+            if kind == 'DOT':
+                self.advance()
+                name = self.expect('IDENT')[1]
+                # A dotted chain a.b.c becomes one node holding its whole path
+                if left[0] == 'attr':
+                    left = ('attr', left[1], left[2] + (name,))
                 else:
-                    error(f"Cannot access '{part}' in {type(obj).__name__}", ln, file, expr)
-            return obj
-        except KeyError:
-            error(f"Variable '{parts[0]}' not defined", ln, file, expr)
-    
-    # Variable lookup
-    if current_scope.exists(expr):
-        return current_scope.get(expr)
-    
-    # Number literals
+                    left = ('attr', left, (name,))
+                continue
+
+            if kind != 'OP' or value not in INFIX_BP:
+                break
+            lbp, rbp = INFIX_BP[value]
+            if lbp < min_bp:
+                break
+            self.advance()
+            right = self.parse_expr(rbp)
+
+            if value in ('or', 'and'):
+                left = fold_constants((value, left, right))
+            else:
+                left = fold_constants(('bin', value, left, right))
+
+        return left
+
+# Larger exponents are left to run time so compiling stays cheap
+MAX_FOLDED_EXPONENT = 64
+
+def fold_constants(node: Node) -> Node:
+    """Evaluate an operator node whose operands are all constants
+
+    Anything that would raise (division by zero, mismatched types) is left
+    unfolded so the error is still reported when the line runs.
+    """
+    kind = node[0]
+    operands = node[2:] if kind == 'bin' else node[1:]
+    if any(item[0] != 'const' for item in operands):
+        return node
     try:
-        return float(expr) if '.' in expr else int(expr)
-    except:
+        if kind == 'bin':
+            op, a, b = node[1], node[2][1], node[3][1]
+            if op == '^' and not (isinstance(b, (int, float)) and abs(b) <= MAX_FOLDED_EXPONENT):
+                return node
+            if op == '*' and (isinstance(a, str) or isinstance(b, str)):
+                return node  # repeating a string could build a huge constant
+            return ('const', BINARY_OPS[op](a, b))
+        if kind == 'and':
+            return ('const', bool(node[1][1]) and bool(node[2][1]))
+        if kind == 'or':
+            return ('const', bool(node[1][1]) or bool(node[2][1]))
+        if kind == 'not':
+            return ('const', not node[1][1])
+        if kind == 'neg':
+            return ('const', -node[1][1])
+    except Exception:
         pass
-    
-    error(f"Invalid expression: {expr}", ln, file, expr)
+    return node
 
-# ==================== BUILT-IN FUNCTIONS ====================
-def get_builtin_functions():
-    """Return list of built-in function names"""
-    return [
-        'print', 'اطبع', 'input', 'ادخال', 'len', 'طول', 'type', 'نوع',
-        'str', 'نص', 'int', 'صحيح', 'float', 'عشري', 'sqrt', 'جذر',
-        'pow', 'أس', 'random', 'عشوائي', 'range', 'نطاق', 'push', 'اضف',
-        'pop', 'احذف', 'readFile', 'اقرأملف', 'writeFile', 'اكتبملف',
-        'fileExists', 'ملفموجود', 'deleteFile', 'احذفملف', 'sleep', 'انتظر',
-        'json', 'جيسون', 'parseJson', 'حللجيسون', 'html', 'import', 'استورد',
-        'export', 'صدر', 'keys', 'مفاتيح', 'values', 'قيم', 'abs', 'مطلق',
-        'round', 'تقريب', 'floor', 'أرضية', 'ceil', 'سقف', 'max', 'أكبر',
-        'min', 'أصغر', 'sum', 'مجموع', 'join', 'ضم', 'split', 'تقسيم'
-    ]
-
-def parse_args(args_str, ln=None, file=None):
-    """Parse function arguments"""
-    if not args_str:
-        return []
-    
-    args = []
-    depth = 0
-    current = ""
-    in_string = False
-    string_char = None
-    
-    for char in args_str + ',':
-        if char in ('"', "'") and (not current or current[-1] != '\\'):
-            if not in_string:
-                in_string = True
-                string_char = char
-            elif char == string_char:
-                in_string = False
-        
-        if not in_string:
-            if char in '[{(':
-                depth += 1
-            elif char in ']})':
-                depth -= 1
-            
-            if char == ',' and depth == 0:
-                if current.strip():
-                    args.append(evaluate(current.strip(), ln, file))
-                current = ""
-                continue
-        
-        current += char
-    
-    return args
+def parse_expression(expr: str, ln: Optional[int] = None, file: Optional[str] = None) -> Node:
+    """Tokenize and parse an expression string into an AST"""
+    # Bare names and integers, the most common operands, skip the tokenizer
+    if NAME_RE.fullmatch(expr) and expr not in WORD_OPS:
+        if expr in LITERALS:
+            return ('const', LITERALS[expr])
+        return ('var', sys.intern(expr))
+    if expr.isdecimal():
+        return ('const', int(expr))
 
-def call_function(name, args_str, ln=None, file=None):
-    """Call a built-in or user-defined function"""
-    global current_scope
-    
-    args = parse_args(args_str, ln, file) if args_str else []
-    
-    # Print function
-    if name in ('print', 'اطبع'):
-        v = " ".join(str(a) for a in args)
-        print(v)
-        output.append(v)
-        return None
-    
-    # Input function
-    elif name in ('input', 'ادخال'):
-        prompt = str(args[0]) if args else ""
-        if prompt:
-            print(prompt, end='')
-        v = input()
-        try:
-            return float(v) if "." in v else int(v) if v.lstrip('-').isdigit() else v
-        except:
-            return v
-    
-    # Length function
-    elif name in ('len', 'طول'):
-        if not args:
-            error("len requires one argument", ln, file)
-        if not hasattr(args[0], '__len__'):
-            error("Value has no length", ln, file)
-        return len(args[0])
-    
-    # Type function
-    elif name in ('type', 'نوع'):
-        if not args:
-            error("type requires one argument", ln, file)
-        return type(args[0]).__name__
-    
-    # String conversion
-    elif name in ('str', 'نص'):
-        if not args:
-            error("str requires one argument", ln, file)
-        return str(args[0])
-    
-    # Integer conversion
-    elif name in ('int', 'صحيح'):
-        if not args:
-            error("int requires one argument", ln, file)
-        try:
-            return int(float(args[0]))
-        except:
-            error("Cannot convert to integer", ln, file)
-    
-    # Float conversion
-    elif name in ('float', 'عشري'):
-        if not args:
-            error("float requires one argument", ln, file)
-        try:
-            return float(args[0])
-        except:
-            error("Cannot convert to float", ln, file)
-    
-    # Math functions
-    elif name in ('sqrt', 'جذر'):
-        if not args or not isinstance(args[0], (int, float)):
-            error("sqrt requires a number", ln, file)
-        return math.sqrt(args[0])
-    
-    elif name in ('pow', 'أس'):
-        if len(args) != 2:
-            error("pow requires two arguments", ln, file)
-        return pow(args[0], args[1])
-    
-    elif name in ('abs', 'مطلق'):
-        if not args:
-            error("abs requires one argument", ln, file)
-        return abs(args[0])
-    
-    elif name in ('round', 'تقريب'):
-        if not args:
-            error("round requires one argument", ln, file)
-        return round(args[0], args[1] if len(args) > 1 else 0)
-    
-    elif name in ('floor', 'أرضية'):
-        if not args:
-            error("floor requires one argument", ln, file)
-        return math.floor(args[0])
-    
-    elif name in ('ceil', 'سقف'):
-        if not args:
-            error("ceil requires one argument", ln, file)
-        return math.ceil(args[0])
-    
-    elif name in ('max', 'أكبر'):
-        if not args:
-            error("max requires at least one argument", ln, file)
-        return max(args)
-    
-    elif name in ('min', 'أصغر'):
-        if not args:
-            error("min requires at least one argument", ln, file)
-        return min(args)
-    
-    elif name in ('sum', 'مجموع'):
-        if not args:
-            error("sum requires one argument", ln, file)
-        return sum(args[0])
-    
-    # Random function
-    elif name in ('random', 'عشوائي'):
-        if not args:
-            return random.random()
-        if len(args) != 2:
-            error("random requires two arguments for range", ln, file)
-        return random.randint(int(args[0]), int(args[1]))
-    
-    # Range function
-    elif name in ('range', 'نطاق'):
-        if len(args) == 1:
-            return list(range(int(args[0])))
-        elif len(args) == 2:
-            return list(range(int(args[0]), int(args[1])))
-        elif len(args) == 3:
-            return list(range(int(args[0]), int(args[1]), int(args[2])))
-        error("range requires 1-3 arguments", ln, file)
-    
-    # Array functions
-    elif name in ('push', 'اضف'):
-        if len(args) != 2:
-            error("push requires (array, value)", ln, file)
-        if not isinstance(args[0], list):
-            error("First argument must be an array", ln, file)
-        args[0].append(args[1])
-        return None
-    
-    elif name in ('pop', 'احذف'):
-        if not args or not isinstance(args[0], list):
-            error("pop requires an array", ln, file)
-        if not args[0]:
-            error("Array is empty", ln, file)
-        return args[0].pop()
-    
-    # Object functions
-    elif name in ('keys', 'مفاتيح'):
-        if not args:
-            error("keys requires one argument", ln, file)
-        if not isinstance(args[0], dict):
-            error("keys requires an object", ln, file)
-        return list(args[0].keys())
-    
-    elif name in ('values', 'قيم'):
-        if not args:
-            error("values requires one argument", ln, file)
-        if not isinstance(args[0], dict):
-            error("values requires an object", ln, file)
-        return list(args[0].values())
-    
-    # String functions
-    elif name in ('join', 'ضم'):
-        if len(args) != 2:
-            error("join requires (separator, array)", ln, file)
-        return str(args[0]).join(str(x) for x in args[1])
-    
-    elif name in ('split', 'تقسيم'):
-        if not args:
-            error("split requires at least one argument", ln, file)
-        sep = args[1] if len(args) > 1 else " "
-        return str(args[0]).split(str(sep))
-    
-    # File I/O functions
-    elif name in ('readFile', 'اقرأملف'):
-        if not args:
-            error("readFile requires a filename", ln, file)
-        try:
-            with open(args[0], 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            error(f"Failed to read file: {e}", ln, file)
-    
-    elif name in ('writeFile', 'اكتبملف'):
-        if len(args) < 2:
-            error("writeFile requires (filename, content)", ln, file)
+    parser = Parser(tokenize(expr, ln, file), expr, ln, file)
+    if parser.peek()[0] == 'END':
+        return ('const', None)
+    node = parser.parse_expr()
+    if parser.peek()[0] != 'END':
+        parser.fail()
+    return node
+
+# ==================== AST EVALUATION ====================
+BINARY_OPS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a / b,
+    '%': lambda a, b: a % b,
+    '^': lambda a, b: a ** b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b,
+}
+
+def _eval_const(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    return node[1]
+
+def _eval_var(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    # Names bound in the scope itself (all of top-level code) skip the walk
+    values = scope.vars
+    name = node[1]
+    if name in values:
+        return values[name]
+    try:
+        return scope.get(name)
+    except KeyError:
+        error(f"Variable '{name}' not defined", ln, file)
+
+def _eval_local(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    _, depth, slot, name = node
+    # Enclosing frames of a running function always exist
+    frame: Any = scope
+    for _ in range(depth):
+        frame = frame.parent
+    value = frame.slots[slot]
+    if value is UNSET:
+        # Not assigned in this frame yet: fall back to the enclosing scopes
         try:
-            with open(args[0], 'w', encoding='utf-8') as f:
-                f.write(str(args[1]))
-            return True
-        except Exception as e:
-            error(f"Failed to write file: {e}", ln, file)
+            return frame.parent.get(name)
+        except KeyError:
+            error(f"Variable '{name}' not defined", ln, file)
+    return value
+
+def _eval_bin(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    op = node[1]
+    left = eval_ast(node[2], scope, ln, file)
+    right = eval_ast(node[3], scope, ln, file)
+    if op == '/' and right == 0:
+        error("Division by zero", ln, file)
+    return BINARY_OPS[op](left, right)
+
+def _eval_and(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    return bool(eval_ast(node[1], scope, ln, file)) and bool(eval_ast(node[2], scope, ln, file))
+
+def _eval_or(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    return bool(eval_ast(node[1], scope, ln, file)) or bool(eval_ast(node[2], scope, ln, file))
+
+def _eval_not(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    return not eval_ast(node[1], scope, ln, file)
+
+def _eval_neg(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    return -eval_ast(node[1], scope, ln, file)
+
+def _eval_list(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    evaluate = eval_ast
+    return [evaluate(item, scope, ln, file) for item in node[1]]
+
+def _eval_dict(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    return {eval_ast(k, scope, ln, file): eval_ast(v, scope, ln, file) for k, v in node[1]}
+
+def _eval_index(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    obj = eval_ast(node[1], scope, ln, file)
+    idx = eval_ast(node[2], scope, ln, file)
+    try:
+        return obj[idx]
+    except (IndexError, KeyError, TypeError):
+        error(f"Invalid index: {idx}", ln, file)
+
+def _eval_attr(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    obj = eval_ast(node[1], scope, ln, file)
+    for part in node[2]:
+        if not isinstance(obj, dict):
+            error(f"Cannot access '{part}' in {type(obj).__name__}", ln, file)
+        if part not in obj:
+            error(f"Key '{part}' not found", ln, file)
+        obj = obj[part]
+    return obj
+
+def _eval_call(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    evaluate = eval_ast
+    args = [evaluate(arg, scope, ln, file) for arg in node[2]]
+    # Builtin calls were bound to 'builtin' nodes by the parser
+    return call_user_function(node[1], args, ln, file)
+
+def _eval_builtin(node: Node, scope: 'Scope', ln: Optional[int], file: Optional[str]) -> Any:
+    evaluate = eval_ast
+    return node[1]([evaluate(arg, scope, ln, file) for arg in node[2]], ln, file)
+
+EVAL_DISPATCH = {
+    'const': _eval_const,
+    'var': _eval_var,
+    'local': _eval_local,
+    'bin': _eval_bin,
+    'and': _eval_and,
+    'or': _eval_or,
+    'not': _eval_not,
+    'neg': _eval_neg,
+    'list': _eval_list,
+    'dict': _eval_dict,
+    'index': _eval_index,
+    'attr': _eval_attr,
+    'call': _eval_call,
+    'builtin': _eval_builtin,
+}
+
+def eval_ast(node: Node, scope: 'Scope', ln: Optional[int] = None, file: Optional[str] = None) -> Any:
+    """Evaluate an AST node in the given scope"""
+    return EVAL_DISPATCH[node[0]](node, scope, ln, file)
+
+def resolve_names(node: Node, cscope: 'CompileScope') -> Node:
+    """Return a copy of node with function locals turned into slot lookups"""
+    kind = node[0]
+    if kind == 'var':
+        found = cscope.resolve(node[1])
+        if found is None:
+            return node
+        return ('local', found[0], found[1], node[1])
+    if kind == 'bin':
+        return ('bin', node[1], resolve_names(node[2], cscope), resolve_names(node[3], cscope))
+    if kind in ('and', 'or', 'index'):
+        return (kind, resolve_names(node[1], cscope), resolve_names(node[2], cscope))
+    if kind in ('not', 'neg'):
+        return (kind, resolve_names(node[1], cscope))
+    if kind == 'attr':
+        return ('attr', resolve_names(node[1], cscope), node[2])
+    if kind == 'list':
+        return ('list', [resolve_names(item, cscope) for item in node[1]])
+    if kind == 'dict':
+        return ('dict', [(resolve_names(k, cscope), resolve_names(v, cscope)) for k, v in node[1]])
+    if kind in ('call', 'builtin'):
+        return (kind, node[1], [resolve_names(arg, cscope) for arg in node[2]])
+    return node
+
+# ==================== BUILT-IN FUNCTIONS ====================
+# Print function
+def _do_print(args, ln, file):
+    v = " ".join(str(a) for a in args)
+    print(v)
+    output.append(v)
+    return None
+
+# Input function: numeric replies are converted, anything else stays text
+# (replies with a "." go through float(), which allows surrounding spaces and
+# digit underscores; the rest must be a plain, optionally negative, integer)
+NUMERIC_INPUT_RE = re.compile(
+    r'\s*[-+]?(?:\d(?:_?\d)*\.(?:\d(?:_?\d)*)?|\.\d(?:_?\d)*)(?:[eE][-+]?\d(?:_?\d)*)?\s*'
+    r'|-?\d+')
+
+def _do_input(args, ln, file):
+    prompt = str(args[0]) if args else ""
+    if prompt:
+        print(prompt, end='')
+    v = input()
+    if NUMERIC_INPUT_RE.fullmatch(v) is None:
+        return v
+    return float(v) if "." in v else int(v)
+
+# Length function
+def _do_len(args, ln, file):
+    if not args:
+        error("len requires one argument", ln, file)
+    if not hasattr(args[0], '__len__'):
+        error("Value has no length", ln, file)
+    return len(args[0])
+
+# Type function
+def _do_type(args, ln, file):
+    if not args:
+        error("type requires one argument", ln, file)
+    return type(args[0]).__name__
+
+# String conversion
+def _do_str(args, ln, file):
+    if not args:
+        error("str requires one argument", ln, file)
+    return str(args[0])
+
+# Integer conversion
+def _do_int(args, ln, file):
+    if not args:
+        error("int requires one argument", ln, file)
+    try:
+        return int(float(args[0]))
+    except:
+        error("Cannot convert to integer", ln, file)
+
+# Float conversion
+def _do_float(args, ln, file):
+    if not args:
+        error("float requires one argument", ln, file)
+    try:
+        return float(args[0])
+    except:
+        error("Cannot convert to float", ln, file)
+
+# Math functions
+def _do_sqrt(args, ln, file):
+    if not args or not isinstance(args[0], (int, float)):
+        error("sqrt requires a number", ln, file)
+    return math.sqrt(args[0])
+
+def _do_pow(args, ln, file):
+    if len(args) != 2:
+        error("pow requires two arguments", ln, file)
+    return pow(args[0], args[1])
+
+def _do_abs(args, ln, file):
+    if not args:
+        error("abs requires one argument", ln, file)
+    return abs(args[0])
+
+def _do_round(args, ln, file):
+    if not args:
+        error("round requires one argument", ln, file)
+    return round(args[0], args[1] if len(args) > 1 else 0)
+
+def _do_floor(args, ln, file):
+    if not args:
+        error("floor requires one argument", ln, file)
+    return math.floor(args[0])
+
+def _do_ceil(args, ln, file):
+    if not args:
+        error("ceil requires one argument", ln, file)
+    return math.ceil(args[0])
+
+def _do_max(args, ln, file):
+    if not args:
+        error("max requires at least one argument", ln, file)
+    return max(args)
+
+def _do_min(args, ln, file):
+    if not args:
+        error("min requires at least one argument", ln, file)
+    return min(args)
+
+def _do_sum(args, ln, file):
+    if not args:
+        error("sum requires one argument", ln, file)
+    return sum(args[0])
+
+# Random function
+def _do_random(args, ln, file):
+    if not args:
+        return random.random()
+    if len(args) != 2:
+        error("random requires two arguments for range", ln, file)
+    return random.randint(int(args[0]), int(args[1]))
+
+# Range function
+def _do_range(args, ln, file):
+    if len(args) == 1:
+        return list(range(int(args[0])))
+    elif len(args) == 2:
+        return list(range(int(args[0]), int(args[1])))
+    elif len(args) == 3:
+        return list(range(int(args[0]), int(args[1]), int(args[2])))
+    error("range requires 1-3 arguments", ln, file)
+
+# Array functions
+def _do_push(args, ln, file):
+    if len(args) != 2:
+        error("push requires (array, value)", ln, file)
+    if not isinstance(args[0], list):
+        error("First argument must be an array", ln, file)
+    args[0].append(args[1])
+    return None
+
+def _do_pop(args, ln, file):
+    if not args or not isinstance(args[0], list):
+        error("pop requires an array", ln, file)
+    if not args[0]:
+        error("Array is empty", ln, file)
+    return args[0].pop()
+
+# Object functions
+def _do_keys(args, ln, file):
+    if not args:
+        error("keys requires one argument", ln, file)
+    if not isinstance(args[0], dict):
+        error("keys requires an object", ln, file)
+    return list(args[0].keys())
+
+def _do_values(args, ln, file):
+    if not args:
+        error("values requires one argument", ln, file)
+    if not isinstance(args[0], dict):
+        error("values requires an object", ln, file)
+    return list(args[0].values())
+
+# String functions
+def _do_join(args, ln, file):
+    if len(args) != 2:
+        error("join requires (separator, array)", ln, file)
+    return str(args[0]).join(str(x) for x in args[1])
+
+def _do_split(args, ln, file):
+    if not args:
+        error("split requires at least one argument", ln, file)
+    sep = args[1] if len(args) > 1 else " "
+    return str(args[0]).split(str(sep))
+
+# File I/O functions
+def _do_read_file(args, ln, file):
+    if not args:
+        error("readFile requires a filename", ln, file)
+    try:
+        with open(args[0], 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception as e:
+        error(f"Failed to read file: {e}", ln, file)
+
+def _do_write_file(args, ln, file):
+    if len(args) < 2:
+        error("writeFile requires (filename, content)", ln, file)
+    try:
+        with open(args[0], 'w', encoding='utf-8') as f:
+            f.write(str(args[1]))
+        return True
+    except Exception as e:
+        error(f"Failed to write file: {e}", ln, file)
+
+def _do_file_exists(args, ln, file):
+    if not args:
+        error("fileExists requires a filename", ln, file)
+    return os.path.exists(args[0])
+
+def _do_delete_file(args, ln, file):
+    if not args:
+        error("deleteFile requires a filename", ln, file)
+    try:
+        os.remove(args[0])
+        return True
+    except Exception as e:
+        error(f"Failed to delete file: {e}", ln, file)
+
+# Utility functions
+def _do_sleep(args, ln, file):
+    if not args:
+        error("sleep requires number of seconds", ln, file)
+    time.sleep(args[0])
+    return None
+
+def _do_json(args, ln, file):
+    if not args:
+        error("json requires a value", ln, file)
+    return json.dumps(args[0], ensure_ascii=False)
+
+def _do_parse_json(args, ln, file):
+    if not args:
+        error("parseJson requires JSON text", ln, file)
+    try:
+        return json.loads(args[0])
+    except:
+        error("Failed to parse JSON", ln, file)
+
+def _do_html(args, ln, file):
+    if not args:
+        error("html requires content", ln, file)
+    return args[0]
+
+# Module functions
+def _do_import(args, ln, file):
+    if not args:
+        error("import requires a filename", ln, file)
+    return import_module(args[0], ln, file)
+
+def _do_export(args, ln, file):
+    if len(args) < 2:
+        error("export requires (name, value)", ln, file)
+    if file and file in modules:
+        modules[file]['exports'][args[0]] = args[1]
+    return None
+
+# Every English/Arabic spelling of a builtin mapped to its handler
+BUILTIN_DISPATCH = {
+    'print': _do_print, 'اطبع': _do_print,
+    'input': _do_input, 'ادخال': _do_input,
+    'len': _do_len, 'طول': _do_len,
+    'type': _do_type, 'نوع': _do_type,
+    'str': _do_str, 'نص': _do_str,
+    'int': _do_int, 'صحيح': _do_int,
+    'float': _do_float, 'عشري': _do_float,
+    'sqrt': _do_sqrt, 'جذر': _do_sqrt,
+    'pow': _do_pow, 'أس': _do_pow,
+    'abs': _do_abs, 'مطلق': _do_abs,
+    'round': _do_round, 'تقريب': _do_round,
+    'floor': _do_floor, 'أرضية': _do_floor,
+    'ceil': _do_ceil, 'سقف': _do_ceil,
+    'max': _do_max, 'أكبر': _do_max,
+    'min': _do_min, 'أصغر': _do_min,
+    'sum': _do_sum, 'مجموع': _do_sum,
+    'random': _do_random, 'عشوائي': _do_random,
+    'range': _do_range, 'نطاق': _do_range,
+    'push': _do_push, 'اضف': _do_push,
+    'pop': _do_pop, 'احذف': _do_pop,
+    'keys': _do_keys, 'مفاتيح': _do_keys,
+    'values': _do_values, 'قيم': _do_values,
+    'join': _do_join, 'ضم': _do_join,
+    'split': _do_split, 'تقسيم': _do_split,
+    'readFile': _do_read_file, 'اقرأملف': _do_read_file,
+    'writeFile': _do_write_file, 'اكتبملف': _do_write_file,
+    'fileExists': _do_file_exists, 'ملفموجود': _do_file_exists,
+    'deleteFile': _do_delete_file, 'احذفملف': _do_delete_file,
+    'sleep': _do_sleep, 'انتظر': _do_sleep,
+    'json': _do_json, 'جيسون': _do_json,
+    'parseJson': _do_parse_json, 'حللجيسون': _do_parse_json,
+    'html': _do_html,
+    'import': _do_import, 'استورد': _do_import,
+    'export': _do_export, 'صدر': _do_export,
+}
+
+def call_user_function(name: str, args: List[Any], ln: Optional[int] = None,
+                       file: Optional[str] = None) -> Any:
+    """Call a user-defined function in a fresh frame"""
+    func = functions.get(name)
+    if func is None:
+        error(f"Function '{name}' not defined", ln, file)
     
-    elif name in ('fileExists', 'ملفموجود'):
-        if not args:
-            error("fileExists requires a filename", ln, file)
-        return os.path.exists(args[0])
+    func_body, func_args, def_scope, def_file, layout, memo, pool = func
     
-    elif name in ('deleteFile', 'احذفملف'):
-        if not args:
-            error("deleteFile requires a filename", ln, file)
+    # @memo functions: reuse results for the same (typed) arguments
+    if memo is not None:
+        key = (*args, *map(type, args))
         try:
-            os.remove(args[0])
-            return True
-        except Exception as e:
-            error(f"Failed to delete file: {e}", ln, file)
-    
-    # Utility functions
-    elif name in ('sleep', 'انتظر'):
-        if not args:
-            error("sleep requires number of seconds", ln, file)
-        time.sleep(args[0])
-        return None
-    
-    elif name in ('json', 'جيسون'):
-        if not args:
-            error("json requires a value", ln, file)
-        return json.dumps(args[0], ensure_ascii=False)
+            cached = memo.get(key, UNSET)
+        except TypeError:
+            memo = None  # arrays/objects as arguments are never cached
+        else:
+            if cached is not UNSET:
+                return cached
+
+    stack, limit = get_call_stack(), MAX_RECURSION_DEPTH
+    if len(stack) >= limit:
+        error(f"Recursion depth exceeded ({limit})", ln, file)
+    stack.append((name, args))
     
-    elif name in ('parseJson', 'حللجيسون'):
-        if not args:
-            error("parseJson requires JSON text", ln, file)
+    func_scope = None
+    if pool:
         try:
-            return json.loads(args[0])
-        except:
-            error("Failed to parse JSON", ln, file)
-    
-    elif name == 'html':
-        if not args:
-            error("html requires content", ln, file)
-        return args[0]
+            func_scope = pool.pop()
+        except IndexError:
+            pass  # another request thread took the last free frame
+    if func_scope is None:
+        func_scope = Scope(parent=def_scope, name=f"func:{name}", layout=layout)
     
-    # Module functions
-    elif name in ('import', 'استورد'):
-        if not args:
-            error("import requires a filename", ln, file)
-        return import_module(args[0], ln, file)
-    
-    elif name in ('export', 'صدر'):
-        if len(args) < 2:
-            error("export requires (name, value)", ln, file)
-        if file and file in modules:
-            modules[file]['exports'][args[0]] = args[1]
-        return None
-    
-    # User-defined functions
-    elif name in functions:
-        func_body, func_args, def_scope = functions[name]
-        
-        call_stack.append(f"{name}({', '.join(str(a)[:20] for a in args)})")
-        
-        if len(call_stack) > MAX_RECURSION_DEPTH:
-            error(f"Recursion depth exceeded ({MAX_RECURSION_DEPTH})", ln, file)
-        
-        try:
-            func_scope = Scope(parent=def_scope, name=f"func:{name}")
-            
-            for i, arg_name in enumerate(func_args):
-                if i < len(args):
-                    func_scope.set(arg_name, args[i])
-                else:
-                    func_scope.set(arg_name, None)
+    try:
+        slots = func_scope.slots
+        while True:
+            # Parameters occupy the first slots of the frame
+            for i in range(len(func_args)):
+                slots[i] = args[i] if i < len(args) else None
             
-            old_scope = current_scope
-            current_scope = func_scope
+            signal = exec_block(func_body, func_scope, def_file)
+            if signal is None or signal[0] != 'tail':
+                break
             
-            try:
-                result = run(func_body, file)
-                return result
-            finally:
-                current_scope = old_scope
+            # A self tail call reruns the body in this frame with new arguments
+            args = signal[1]
+            if functions.get(name) is not func:
+                # Redefined while running: call the new definition normally
+                signal = ('return', call_user_function(name, args, ln, file))
+                break
+            stack[-1] = (name, args)
+            slots = func_scope.slots = [UNSET] * len(layout)
+            if func_scope.vars:
+                func_scope.vars.clear()
         
-        finally:
-            call_stack.pop()
-    
-    else:
-        error(f"Function '{name}' not defined", ln, file)
-
-# ==================== EXPRESSION EVALUATION ====================
-def evaluate(expr, ln=None, file=None):
-    """Main evaluation function"""
-    if not expr or expr.strip().startswith('#'):
-        return None
-    
-    expr = expr.split("#")[0].strip()
-    
-    if not expr:
-        return None
-    
-    try:
-        return eval_arith(expr, ln, file)
-    except ExoError:
-        raise
-    except Exception as e:
-        error(f"Evaluation error: {e}", ln, file, expr)
+        result = signal[1] if signal is not None and signal[0] == 'return' else None
+        if memo is not None:
+            memo[key] = result
+        return result
+    
+    finally:
+        stack.pop()
+        if pool is not None and len(pool) < FRAME_POOL_SIZE:
+            # Drop this call's locals before the frame is reused
+            func_scope.slots = [UNSET] * len(layout)
+            if func_scope.vars:
+                func_scope.vars.clear()
+            pool.append(func_scope)
 
 # ==================== MODULE SYSTEM ====================
+def read_source(path):
+    """Read an EXO source file in one read and decode it once
+
+    Text mode would also translate newlines, but compile_program strips
+    every line, which already drops the '\r' of CRLF files.
+    """
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8')
+
+@functools.lru_cache(maxsize=None)
+def resolve_module_path(module_path, file):
+    """Resolve an import path relative to the importing file"""
+    if file:
+        base_dir = os.path.dirname(os.path.abspath(file))
+        return os.path.join(base_dir, module_path)
+    return module_path
+
 def import_module(module_path, ln=None, file=None):
-    """Import an EXO module"""
-    global current_scope
-    
+    """Import an EXO module, rerunning it only after its file changes"""
     if not module_path.endswith('.exo'):
         module_path += '.exo'
     
-    if file:
-        base_dir = os.path.dirname(os.path.abspath(file))
-        full_path = os.path.join(base_dir, module_path)
-    else:
-        full_path = module_path
-    
-    if full_path in modules:
-        return modules[full_path]['exports']
+    full_path = resolve_module_path(module_path, file)
+    cached = modules.get(full_path)
     
-    if not os.path.exists(full_path):
+    try:
+        mtime = os.path.getmtime(full_path)
+    except OSError:
+        if cached is not None:
+            return cached['exports']
         error(f"File '{module_path}' not found", ln, file)
     
+    if cached is not None and cached['mtime'] == mtime:
+        return cached['exports']
+    
     try:
-        with open(full_path, 'r', encoding='utf-8') as f:
-            code = f.read()
+        code = read_source(full_path)
         
-        modules[full_path] = {'exports': {}}
+        modules[full_path] = {'exports': {}, 'mtime': mtime}
         
-        old_scope = current_scope
         module_scope = Scope(parent=global_scope, name=f"module:{module_path}")
-        current_scope = module_scope
-        
-        try:
-            run(code, full_path)
-        finally:
-            current_scope = old_scope
+        run(code, full_path, module_scope)
         
         return modules[full_path]['exports']
     
@@ -814,306 +1117,626 @@ def import_module(module_path, ln=None, file=None):
     except Exception as e:
         error(f"Failed to load module: {e}", ln, file)
 
-# ==================== CODE EXECUTION ====================
-def run(code_lines, file=None):
-    """Execute EXO code"""
-    global current_scope
-    
-    if isinstance(code_lines, str):
-        code_lines = code_lines.split('\n')
-    
-    i = 0
-    while i < len(code_lines):
-        line = code_lines[i].strip()
-        
-        if not line or line.startswith('#'):
-            i += 1
+# ==================== COMPILER ====================
+# Opcodes of compiled instructions, numbered to index EXEC_HANDLERS
+(OP_LET, OP_LET_LOCAL, OP_ASSIGN, OP_STORE, OP_SET_INDEX, OP_SET_ATTR,
+ OP_EXPR, OP_RETURN, OP_TAIL, OP_BREAK, OP_CONTINUE, OP_ROUTE,
+ OP_FUNC, OP_IF, OP_WHILE, OP_FOR, OP_FOR_RANGE) = range(17)
+
+# A compiled statement: (opcode, line number, source line, *operands).
+# Plain tuples keep CPython's fast paths for indexing and unpacking.
+Instr = Tuple[Any, ...]
+
+# First word of a statement line mapped to the opcode it compiles to
+STATEMENT_OPS = {
+    **dict.fromkeys(VAR_KEYWORDS, OP_LET),
+    **dict.fromkeys(RETURN_KEYWORDS, OP_RETURN),
+    **dict.fromkeys(ROUTE_KEYWORDS, OP_ROUTE),
+    **dict.fromkeys(FUNC_KEYWORDS, OP_FUNC),
+    **dict.fromkeys(IF_KEYWORDS, OP_IF),
+    **dict.fromkeys(WHILE_KEYWORDS, OP_WHILE),
+    **dict.fromkeys(FOR_KEYWORDS, OP_FOR),
+}
+
+# Statements made of a single keyword
+BARE_STATEMENT_OPS = {
+    **dict.fromkeys(RETURN_KEYWORDS, OP_RETURN),
+    **dict.fromkeys(BREAK_KEYWORDS, OP_BREAK),
+    **dict.fromkeys(CONTINUE_KEYWORDS, OP_CONTINUE),
+}
+
+# Parsed expressions and compiled programs, keyed by source text
+_AST_CACHE: Dict[str, Node] = {}
+_PROGRAM_CACHE: Dict[str, List[Instr]] = {}
+
+def compile_expression(expr, ln=None, file=None, cscope=None):
+    """Parse an expression, reusing the AST of identical source text"""
+    node = _AST_CACHE.get(expr)
+    if node is None:
+        node = _AST_CACHE[expr] = parse_expression(expr, ln, file)
+    if cscope is not None:
+        node = resolve_names(node, cscope)
+    return node
+
+# Comparison operators are listed so their '=' is not taken for assignment
+ASSIGN_DELIMS = ('==', '!=', '<=', '>=', '=')
+
+# Scanner patterns keyed by delimiter tuple, built on first use
+_SPLIT_PATTERNS: Dict[Tuple[str, ...], 're.Pattern[str]'] = {}
+
+def _split_pattern(delims: Sequence[str]) -> 're.Pattern[str]':
+    """Regex finding quotes, brackets, '#' and the delimiters, longest first"""
+    key = tuple(delims)
+    pattern = _SPLIT_PATTERNS.get(key)
+    if pattern is None:
+        ordered = sorted(key, key=len, reverse=True)
+        pattern = _SPLIT_PATTERNS[key] = re.compile(
+            '|'.join([r'["\'()\[\]{}#]'] + [re.escape(d) for d in ordered]))
+    return pattern
+
+def scan_splits(s: str, delims: Sequence[str]) -> Iterator[Tuple[int, int, Optional[str]]]:
+    """Yield (start, end, delim) spans of s between top-level delimiters
+
+    Delimiters inside strings or brackets are skipped and a top-level '#'
+    ends the scan. The final span is yielded with delim None. The regex
+    jumps straight to the next significant character, so the plain text
+    in between is never walked in Python.
+    """
+    search = _split_pattern(delims).search
+    depth: int = 0
+    start: int = 0
+    i: int = 0
+    n: int = len(s)
+
+    while True:
+        m = search(s, i)
+        if m is None:
+            i = n
+            break
+        token = m.group()
+        i = m.end()
+
+        if token in ('"', "'"):
+            closed = STRING_RE.match(s, m.start())
+            if closed is None:
+                i = n
+                break
+            i = closed.end()
+        elif token in '([{':
+            depth += 1
+        elif token in ')]}':
+            depth -= 1
+        elif token == '#':
+            i = m.start()
+            break
+        elif depth == 0:
+            yield start, m.start(), token
+            start = i
+
+    yield start, i, None
+
+def split_top_level(s: str, delims: Sequence[str]) -> List[str]:
+    """Split s at top-level delimiters, returning the stripped parts"""
+    return [s[a:b].strip() for a, b, _ in scan_splits(s, delims)]
+
+def find_assign(line: str) -> int:
+    """Return the index of a top-level '=' assignment in line, or -1"""
+    for _, end, delim in scan_splits(line, ASSIGN_DELIMS):
+        if delim == '=':
+            return end
+    return -1
+
+def compile_assignment(text, line, ln, file=None, declare=False, cscope=None, eq=None):
+    """Compile `target = value` into a let/assign/set_index/set_attr instruction"""
+    if eq is None:
+        eq = find_assign(text)
+    if eq == -1:
+        error("Invalid syntax: use = to assign value", ln, file, line)
+
+    target = text[:eq].strip()
+    value = compile_expression(text[eq+1:].strip(), ln, file, cscope)
+
+    if target.isidentifier():
+        target = sys.intern(target)
+        if cscope is None:
+            return (OP_LET if declare else OP_ASSIGN, ln, line, target, value)
+        if declare:
+            return (OP_LET_LOCAL, ln, line, cscope.declare(target), value)
+        found = cscope.resolve(target)
+        if found is not None:
+            return (OP_STORE, ln, line, found[0], found[1], target, value)
+        return (OP_ASSIGN, ln, line, target, value)
+
+    node = compile_expression(target, ln, file, cscope) if target else None
+    if node and node[0] == 'index':
+        return (OP_SET_INDEX, ln, line, node[1], node[2], value)
+    if node and node[0] == 'attr':
+        # Walk all but the last key of the path, then store under that key
+        _, base, path = node
+        target = ('attr', base, path[:-1]) if len(path) > 1 else base
+        return (OP_SET_ATTR, ln, line, target, path[-1], value)
+
+    error(f"Invalid variable name: {target}", ln, file, line)
+
+def mark_tail_calls(block, fn):
+    """Turn `return fn(...)` inside fn's own body into OP_TAIL instructions
+
+    Nothing runs in the frame after such a call, so call_user_function can
+    rebind the parameters and rerun the body instead of recursing. Nested
+    function definitions are compiled, and marked, on their own.
+    """
+    marked = []
+    for instr in block:
+        op = instr[0]
+        if op == OP_RETURN:
+            node = instr[3]
+            if node is not None and node[0] == 'call' and node[1] == fn:
+                instr = (OP_TAIL, instr[1], instr[2], node[2])
+        elif op == OP_IF:
+            instr = instr[:4] + (mark_tail_calls(instr[4], fn), mark_tail_calls(instr[5], fn))
+        elif op == OP_WHILE:
+            instr = instr[:4] + (mark_tail_calls(instr[4], fn),)
+        elif op == OP_FOR or op == OP_FOR_RANGE:
+            instr = instr[:6] + (mark_tail_calls(instr[6], fn),)
+        marked.append(instr)
+    return marked
+
+class OpenBlock:
+    """A block header whose closing 'end' compile_lines has not reached yet"""
+    __slots__ = ('op', 'ln', 'line', 'head', 'body', 'cscope', 'branches')
+
+    def __init__(self, op, ln, line, head, cscope):
+        self.op = op
+        self.ln = ln
+        self.line = line
+        self.head = head
+        self.body = []
+        # Scope the body compiles against (a function's own for OP_FUNC)
+        self.cscope = cscope
+        # Finished (ln, line, cond, body) branches of an if / else if chain
+        self.branches = []
+
+def close_block(block):
+    """Build the instruction for a block once its 'end' is reached"""
+    op, ln, line, head, body = block.op, block.ln, block.line, block.head, block.body
+
+    if op == OP_IF:
+        # head is None once the chain reached its plain 'else'
+        if head is None:
+            else_block = body
+        else:
+            block.branches.append((ln, line, head, body))
+            else_block = []
+        # Fold `else if` branches into nested ifs inside the else block
+        for ln, line, cond, branch in reversed(block.branches):
+            instr = (OP_IF, ln, line, cond, branch, else_block)
+            else_block = [instr]
+        return instr
+
+    if op == OP_FUNC:
+        fn, args_names, memo = head
+        cscope = block.cscope
+        if not cscope.closures:
+            body = mark_tail_calls(body, fn)
+        return (OP_FUNC, ln, line, fn, args_names, body, cscope.slots, memo, cscope.closures)
+
+    if op == OP_FOR:
+        vn, slot, iterable = head
+        # Loops over range(...) with 1-3 bounds skip building the list
+        if iterable[0] == 'builtin' and iterable[1] is _do_range and 1 <= len(iterable[2]) <= 3:
+            return (OP_FOR_RANGE, ln, line, vn, slot, iterable[2], body)
+        return (OP_FOR, ln, line, vn, slot, iterable, body)
+
+    return (op, ln, line, head, body)
+
+def compile_lines(lines, file=None):
+    """Compile stripped source lines into instructions in a single pass
+
+    Block headers push an OpenBlock and the matching 'end' pops it, so each
+    line is looked at once however deeply it is nested. Inside a function
+    body cscope maps locals to frame slots; top-level code leaves it as
+    None and looks names up by name at run time.
+    """
+    program = []
+    body = program
+    cscope = None
+    stack = []
+    memo = False
+
+    for i, line in enumerate(lines):
+        ln = i + 1
+
+        if not line or line[0] == '#':
             continue
-        
-        try:
-            # Variable declaration
-            if line.startswith(('let ', 'متغير ', 'var ', 'const ')):
-                prefix_len = len(line.split()[0]) + 1
-                rest = line[prefix_len:].strip()
-                
-                # Array/object element assignment
-                if '[' in rest and '=' in rest and rest.find('[') < rest.find('='):
-                    vn = rest[:rest.find('[')].strip()
-                    idx_expr = rest[rest.find('[')+1:rest.find(']')]
-                    val_expr = rest.split('=', 1)[1].strip()
-                    
-                    try:
-                        var = current_scope.get(vn)
-                        idx = evaluate(idx_expr, i+1, file)
-                        var[idx] = evaluate(val_expr, i+1, file)
-                    except KeyError:
-                        error(f"Variable '{vn}' not defined", i+1, file, line)
-                
-                else:
-                    if '=' not in rest:
-                        error("Invalid syntax: use = to assign value", i+1, file, line)
-                    
-                    name, value = rest.split('=', 1)
-                    name = name.strip()
-                    
-                    if not name.isidentifier():
-                        error(f"Invalid variable name: {name}", i+1, file, line)
-                    
-                    current_scope.set(name, evaluate(value.strip(), i+1, file))
-            
-            # Return statement
-            elif line.startswith(('return ', 'ارجع ')):
-                prefix_len = 7 if line.startswith('return ') else 6
-                return evaluate(line[prefix_len:].strip(), i+1, file) if line[prefix_len:].strip() else None
-            
-            # Break statement
-            elif line in ('break', 'اكسر'):
-                return 'break'
-            
-            # Continue statement
-            elif line in ('continue', 'استمر'):
-                return 'continue'
-            
-            # Route definition
-            elif line.startswith(('route ', 'مسار ')):
-                route_path = line[6:].strip() if line.startswith('route ') else line[5:].strip()
-                if not route_path.startswith('/'):
-                    route_path = '/' + route_path
-                
-                body = []
-                depth = 1
-                i += 1
-                while i < len(code_lines):
-                    curr = code_lines[i].strip()
-                    if curr.startswith(('route ', 'مسار ', 'func ', 'دالة ', 'function ', 'if ', 'اذا ', 'while ', 'بينما ', 'for ', 'لكل ')):
-                        depth += 1
-                    elif curr in ('end', 'نهاية'):
-                        depth -= 1
-                        if depth == 0:
-                            break
-                    body.append(code_lines[i])
-                    i += 1
-                web_routes[route_path] = body
-                print(f"✅ Route: {route_path}")
-            
-            # Function definition
-            elif line.startswith(('func ', 'دالة ', 'function ')):
-                prefix_len = len(line.split()[0]) + 1
-                rest = line[prefix_len:].strip()
-                if '(' not in rest or ')' not in rest:
-                    error("Invalid function syntax", i+1, file, line)
-                
-                fn = rest[:rest.find('(')].strip()
-                args_str = rest[rest.find('(')+1:rest.find(')')]
-                args_names = [a.strip() for a in args_str.split(',') if a.strip()]
-                
-                body = []
-                depth = 1
-                i += 1
-                while i < len(code_lines):
-                    curr = code_lines[i].strip()
-                    if curr.startswith(('func ', 'دالة ', 'function ', 'if ', 'اذا ', 'while ', 'بينما ', 'for ', 'لكل ', 'route ', 'مسار ')):
-                        depth += 1
-                    elif curr in ('end', 'نهاية'):
-                        depth -= 1
-                        if depth == 0:
-                            break
-                    body.append(code_lines[i])
-                    i += 1
-                
-                functions[fn] = (body, args_names, current_scope)
-            
-            # If-else statement
-            elif line.startswith(('if ', 'اذا ')):
-                prefix_len = 3 if line.startswith('if ') else 4
-                executed = False
-                
-                while True:
-                    cond = line[prefix_len:].strip()
-                    body = []
-                    depth = 1
-                    i += 1
-                    
-                    while i < len(code_lines):
-                        curr = code_lines[i].strip()
-                        if curr.startswith(('if ', 'اذا ', 'while ', 'بينما ', 'for ', 'لكل ', 'func ', 'دالة ', 'function ', 'route ', 'مسار ')):
-                            depth += 1
-                        elif curr in ('end', 'نهاية', 'else', 'والا') or curr.startswith(('else if ', 'والا اذا ')):
-                            if depth == 1:
-                                break
-                            if curr in ('end', 'نهاية'):
-                                depth -= 1
-                        body.append(code_lines[i])
-                        i += 1
-                    
-                    if not executed and evaluate(cond, i+1, file):
-                        result = run(body, file)
-                        executed = True
-                        if result in ('break', 'continue') or result is not None:
-                            return result
-                    
-                    if i >= len(code_lines):
-                        break
-                    curr = code_lines[i].strip()
-                    
-                    if curr in ('end', 'نهاية'):
-                        break
-                    elif curr.startswith(('else if ', 'والا اذا ')):
-                        prefix_len = 8 if curr.startswith('else if ') else 9
-                        line = curr
-                    elif curr in ('else', 'والا'):
-                        if not executed:
-                            i += 1
-                            body = []
-                            depth = 1
-                            while i < len(code_lines):
-                                curr = code_lines[i].strip()
-                                if curr.startswith(('if ', 'اذا ', 'while ', 'بينما ', 'for ', 'لكل ', 'func ', 'دالة ', 'function ', 'route ', 'مسار ')):
-                                    depth += 1
-                                elif curr in ('end', 'نهاية'):
-                                    depth -= 1
-                                    if depth == 0:
-                                        break
-                                body.append(code_lines[i])
-                                i += 1
-                            result = run(body, file)
-                            if result in ('break', 'continue') or result is not None:
-                                return result
-                        break
-            
-            # While loop
-            elif line.startswith(('while ', 'بينما ')):
-                prefix_len = 6 if line.startswith('while ') else 7
-                cond = line[prefix_len:].strip()
-                
-                body = []
-                depth = 1
-                i += 1
-                while i < len(code_lines):
-                    curr = code_lines[i].strip()
-                    if curr.startswith(('if ', 'اذا ', 'while ', 'بينما ', 'for ', 'لكل ', 'func ', 'دالة ', 'function ', 'route ', 'مسار ')):
-                        depth += 1
-                    elif curr in ('end', 'نهاية'):
-                        depth -= 1
-                        if depth == 0:
-                            break
-                    body.append(code_lines[i])
-                    i += 1
-                
-                while evaluate(cond, i+1, file):
-                    result = run(body, file)
-                    if result == 'break':
-                        break
-                    elif result == 'continue':
-                        continue
-                    elif result is not None:
-                        return result
-            
-            # For loop
-            elif line.startswith(('for ', 'لكل ')):
-                prefix_len = 4 if line.startswith('for ') else 5
-                rest = line[prefix_len:].strip()
-                
-                if ' in ' not in rest and ' في ' not in rest:
-                    error("Invalid for syntax", i+1, file, line)
-                
-                sep = ' in ' if ' in ' in rest else ' في '
-                vn, iter_expr = rest.split(sep, 1)
-                vn = vn.strip()
-                iterable = evaluate(iter_expr.strip(), i+1, file)
-                
-                if not hasattr(iterable, '__iter__'):
-                    error("Value is not iterable", i+1, file, line)
-                
-                body = []
-                depth = 1
-                i += 1
-                while i < len(code_lines):
-                    curr = code_lines[i].strip()
-                    if curr.startswith(('if ', 'اذا ', 'while ', 'بينما ', 'for ', 'لكل ', 'func ', 'دالة ', 'function ', 'route ', 'مسار ')):
-                        depth += 1
-                    elif curr in ('end', 'نهاية'):
-                        depth -= 1
-                        if depth == 0:
-                            break
-                    body.append(code_lines[i])
-                    i += 1
-                
-                for item in iterable:
-                    current_scope.set(vn, item)
-                    result = run(body, file)
-                    if result == 'break':
-                        break
-                    elif result == 'continue':
-                        continue
-                    elif result is not None:
-                        return result
-            
-            # Function call
-            elif '(' in line and ')' in line and not line.startswith(('let ', 'var ', 'متغير ', 'const ')):
-                evaluate(line, i+1, file)
-            
-            # Variable assignment
-            elif '=' in line and not line.startswith(('let ', 'var ', 'متغير ', 'const ')):
-                name, value = line.split('=', 1)
-                name = name.strip()
-                
-                # Array/object element assignment
-                if '[' in name:
-                    vn = name[:name.find('[')].strip()
-                    idx_expr = name[name.find('[')+1:name.find(']')]
-                    try:
-                        var = current_scope.get(vn)
-                        idx = evaluate(idx_expr, i+1, file)
-                        var[idx] = evaluate(value.strip(), i+1, file)
-                    except KeyError:
-                        error(f"Variable '{vn}' not defined", i+1, file, line)
-                # Property assignment
-                elif '.' in name:
-                    parts = name.split('.')
-                    try:
-                        obj = current_scope.get(parts[0])
-                        for part in parts[1:-1]:
-                            obj = obj[part]
-                        obj[parts[-1]] = evaluate(value.strip(), i+1, file)
-                    except KeyError:
-                        error(f"Variable '{parts[0]}' not defined", i+1, file, line)
-                else:
-                    if not current_scope.exists(name):
-                        error(f"Variable '{name}' not defined - use 'let' to declare it first", i+1, file, line)
-                    current_scope.set(name, evaluate(value.strip(), i+1, file), local=False)
+
+        # Keywords need a following space, so `letter = 1` stays an assignment
+        first, sep, rest = line.partition(' ')
+        op = STATEMENT_OPS.get(first) if sep else BARE_STATEMENT_OPS.get(line)
+
+        if memo and op != OP_FUNC:
+            error("@memo must be followed by a function definition", ln, file, line)
+
+        # Closing lines of the innermost open block
+        if stack:
+            top = stack[-1]
+            if line in END_KEYWORDS:
+                stack.pop()
+                body = stack[-1].body if stack else program
+                cscope = stack[-1].cscope if stack else None
+                body.append(close_block(top))
+                continue
+
+            if top.op == OP_IF and top.head is not None and first in ELSE_KEYWORDS:
+                word, sep, cond = rest.partition(' ')
+                if sep and word in IF_KEYWORDS:
+                    top.branches.append((top.ln, top.line, top.head, top.body))
+                    top.ln, top.line = ln, line
+                    top.head = compile_expression(cond.strip(), ln, file, cscope)
+                    body = top.body = []
+                    continue
+                if not rest:
+                    top.branches.append((top.ln, top.line, top.head, top.body))
+                    top.head = None
+                    body = top.body = []
+                    continue
+
+        # Memoization annotation for the next function
+        if line in MEMO_MARKERS:
+            memo = True
+
+        # Variable declaration
+        elif op == OP_LET:
+            body.append(compile_assignment(rest.strip(), line, ln, file, True, cscope))
+
+        # Return statement
+        elif op == OP_RETURN:
+            value = rest.strip()
+            node = compile_expression(value, ln, file, cscope) if value else None
+            body.append((OP_RETURN, ln, line, node))
+
+        # Break / continue
+        elif op == OP_BREAK or op == OP_CONTINUE:
+            body.append((op, ln, line))
+
+        # Route definition
+        elif op == OP_ROUTE:
+            route_path = rest.strip()
+            if not route_path.startswith('/'):
+                route_path = '/' + route_path
+            # Route bodies run in a fresh request scope under the global
+            # one, never in the frame of a function that registers them
+            stack.append(OpenBlock(OP_ROUTE, ln, line, route_path, None))
+
+        # Function definition
+        elif op == OP_FUNC:
+            rest = rest.strip()
+            if '(' not in rest or ')' not in rest:
+                error("Invalid function syntax", ln, file, line)
+
+            fn = sys.intern(rest[:rest.find('(')].strip())
+            args_str = rest[rest.find('(')+1:rest.find(')')]
+            args_names = [sys.intern(a) for a in split_top_level(args_str, (',',)) if a]
+
+            if cscope is not None:
+                cscope.closures = True
+            func_cscope = CompileScope(parent=cscope)
+            for arg_name in args_names:
+                if arg_name in func_cscope.slots:
+                    error(f"Duplicate parameter: {arg_name}", ln, file, line)
+                func_cscope.declare(arg_name)
+
+            stack.append(OpenBlock(OP_FUNC, ln, line, (fn, args_names, memo), func_cscope))
+            memo = False
+
+        # If-else statement, while loop
+        elif op == OP_IF or op == OP_WHILE:
+            cond = compile_expression(rest.strip(), ln, file, cscope)
+            stack.append(OpenBlock(op, ln, line, cond, cscope))
+
+        # For loop
+        elif op == OP_FOR:
+            rest = rest.strip()
+            _, sep_at, sep = next(scan_splits(rest, FOR_SEPARATORS))
+            if sep is None:
+                error("Invalid for syntax", ln, file, line)
+
+            vn = sys.intern(rest[:sep_at].strip())
+            iter_expr = rest[sep_at + len(sep):]
+            iterable = compile_expression(iter_expr.strip(), ln, file, cscope)
+            slot = cscope.declare(vn) if cscope is not None else None
+            stack.append(OpenBlock(OP_FOR, ln, line, (vn, slot, iterable), cscope))
+
+        # Assignment or expression statement; lines without '=' skip the scan
+        else:
+            eq = find_assign(line) if '=' in line else -1
+            if eq != -1:
+                body.append(compile_assignment(line, line, ln, file, cscope=cscope, eq=eq))
             else:
-                evaluate(line, i+1, file)
-        
-        except ExoError:
-            raise
-        except Exception as e:
-            error(f"Unexpected error: {e}", i+1, file, line)
-        
-        i += 1
-    
+                body.append((OP_EXPR, ln, line, compile_expression(line, ln, file, cscope)))
+
+        # A new block header: its body collects the following lines
+        if stack and body is not stack[-1].body:
+            body = stack[-1].body
+            cscope = stack[-1].cscope
+
+    if stack:
+        error("Missing 'end' for block", stack[0].ln, file, stack[0].line)
+    if memo:
+        error("@memo must be followed by a function definition", len(lines), file)
+
+    return program
+
+def compile_program(code, file=None):
+    """Compile source text (or a list of lines) once and cache the result"""
+    if not isinstance(code, str):
+        code = '\n'.join(code)
+
+    program = _PROGRAM_CACHE.get(code)
+    if program is None:
+        lines = [line.strip() for line in code.split('\n')]
+        program = _PROGRAM_CACHE[code] = compile_lines(lines, file)
+    return program
+
+# ==================== CODE EXECUTION ====================
+# Control-flow signals returned by exec_block; returns are ('return', value)
+BREAK: Any = ('break', None)
+CONTINUE: Any = ('continue', None)
+
+def _exec_let(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, name, value = instr
+    scope.set(name, eval_ast(value, scope, ln, file))
+
+def _exec_let_local(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, slot, value = instr
+    scope.slots[slot] = eval_ast(value, scope, ln, file)
+
+def _exec_store(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, depth, slot, name, value = instr
+    frame: Any = scope
+    for _ in range(depth):
+        frame = frame.parent
+    if frame.slots[slot] is not UNSET:
+        frame.slots[slot] = eval_ast(value, scope, ln, file)
+        return
+    # Local declared further down: assign the outer binding as before
+    owner = frame.parent.owner(name)
+    if owner is None:
+        error(f"Variable '{name}' not defined - use 'let' to declare it first", ln, file, line)
+    owner.set(name, eval_ast(value, scope, ln, file))
+
+def _exec_assign(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, name, value = instr
+    # Resolve the binding once and store straight into the scope holding it
+    owner = scope.owner(name)
+    if owner is None:
+        error(f"Variable '{name}' not defined - use 'let' to declare it first", ln, file, line)
+    owner.set(name, eval_ast(value, scope, ln, file))
+
+def _exec_set_index(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, target, index, value = instr
+    obj = eval_ast(target, scope, ln, file)
+    idx = eval_ast(index, scope, ln, file)
+    obj[idx] = eval_ast(value, scope, ln, file)
+
+def _exec_set_attr(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, target, key, value = instr
+    obj = eval_ast(target, scope, ln, file)
+    if not isinstance(obj, dict):
+        error(f"Cannot access '{key}' in {type(obj).__name__}", ln, file, line)
+    obj[key] = eval_ast(value, scope, ln, file)
+
+def _exec_expr(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    eval_ast(instr[3], scope, instr[1], file)
+
+def _exec_return(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    node = instr[3]
+    return ('return', eval_ast(node, scope, instr[1], file) if node else None)
+
+def _exec_tail(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    evaluate, ln = eval_ast, instr[1]
+    return ('tail', [evaluate(arg, scope, ln, file) for arg in instr[3]])
+
+def _exec_break(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    return BREAK
+
+def _exec_continue(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    return CONTINUE
+
+def _exec_route(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, route_path, body = instr
+    web_routes[route_path] = body
+    print(f"✅ Route: {route_path}")
+
+def _exec_func(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, fn, args_names, body, layout, memo, closures = instr
+    # Frames of functions that define closures may outlive the call, so
+    # only the others recycle theirs through a freelist
+    pool: Optional[List[Scope]] = None if closures else []
+    functions[fn] = (body, args_names, scope, file, layout, {} if memo else None, pool)
+
+def _exec_if(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, cond, body, else_block = instr
+    if eval_ast(cond, scope, ln, file):
+        return exec_block(body, scope, file)
+    if else_block:
+        return exec_block(else_block, scope, file)
+
+def _exec_while(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    _, ln, line, cond, body = instr
+    evaluate, handlers = eval_ast, EXEC_HANDLERS
+    # The body runs inline in this frame; step tracks the statement that
+    # is executing so errors still point at its line
+    step = instr
+    try:
+        while True:
+            step = instr
+            if not evaluate(cond, scope, ln, file):
+                break
+            for step in body:
+                signal = handlers[step[0]](step, scope, file)
+                if signal is not None:
+                    break
+            else:
+                continue
+            if signal is BREAK:
+                break
+            if signal is not CONTINUE:
+                return signal
+    except Exception as e:
+        raise_at(e, step, file)
+
+def _run_for(instr: Instr, items: Any, scope: Scope, file: Optional[str]) -> Any:
+    """Run a for loop's body once per item, binding the loop variable"""
+    _, ln, line, vn, slot, _, body = instr
+    # Resolve where the loop variable lives once, not on every iteration
+    if slot is None:
+        slot = scope.layout.get(vn)
+    store: Any
+    if slot is None:
+        store, key = scope.vars, vn
+    else:
+        store, key = scope.slots, slot
+
+    handlers = EXEC_HANDLERS
+    step = instr
+    try:
+        for item in items:
+            store[key] = item
+            for step in body:
+                signal = handlers[step[0]](step, scope, file)
+                if signal is not None:
+                    break
+            else:
+                step = instr
+                continue
+            step = instr
+            if signal is BREAK:
+                break
+            if signal is not CONTINUE:
+                return signal
+    except Exception as e:
+        raise_at(e, step, file)
+
+def _exec_for(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    ln, line, iter_node = instr[1], instr[2], instr[5]
+    iterable = eval_ast(iter_node, scope, ln, file)
+
+    if not hasattr(iterable, '__iter__'):
+        error("Value is not iterable", ln, file, line)
+
+    return _run_for(instr, iterable, scope, file)
+
+def _exec_for_range(instr: Instr, scope: Scope, file: Optional[str]) -> Any:
+    # `for x in range(...)` counts over a lazy range instead of the list
+    # the range builtin materializes
+    evaluate, ln = eval_ast, instr[1]
+    bounds = [int(evaluate(arg, scope, ln, file)) for arg in instr[5]]
+    return _run_for(instr, range(*bounds), scope, file)
+
+# Indexed by opcode, in the order the OP_* constants are numbered
+EXEC_HANDLERS = [
+    _exec_let, _exec_let_local, _exec_assign, _exec_store,
+    _exec_set_index, _exec_set_attr, _exec_expr, _exec_return,
+    _exec_tail, _exec_break, _exec_continue, _exec_route,
+    _exec_func, _exec_if, _exec_while, _exec_for, _exec_for_range,
+]
+
+def raise_at(e: Exception, instr: Instr, file: Optional[str] = None) -> NoReturn:
+    """Re-raise an exception from instr as an ExoError carrying its line"""
+    if isinstance(e, ExoError):
+        if e.context is None:
+            raise ExoError(e.msg, e.line, e.file, instr[2]) from None
+        raise e
+    if isinstance(e, RecursionError):
+        # Deeply nested blocks can use up Python's stack before the call
+        # stack reaches MAX_RECURSION_DEPTH
+        error(f"Recursion depth exceeded ({len(get_call_stack())})", instr[1], file, instr[2])
+    error(f"Evaluation error: {e}", instr[1], file, instr[2])
+
+def exec_block(block: List[Instr], scope: Scope, file: Optional[str] = None) -> Any:
+    """Execute compiled instructions, returning a control-flow signal or None"""
+    handlers = EXEC_HANDLERS
+    # One handler for the whole block: the loop variable already says
+    # which statement failed
+    try:
+        for instr in block:
+            signal = handlers[instr[0]](instr, scope, file)
+            if signal is not None:
+                return signal
+    except Exception as e:
+        raise_at(e, instr, file)
+
+    return None
+
+def run_block(block: List[Instr], scope: Scope, file: Optional[str] = None) -> Any:
+    """Execute a compiled block and return the value of its return statement"""
+    signal = exec_block(block, scope, file)
+    if signal is not None and signal[0] == 'return':
+        return signal[1]
     return None
 
+def run(code: Any, file: Optional[str] = None, scope: Optional[Scope] = None) -> Any:
+    """Execute EXO code"""
+    if scope is None:
+        scope = global_scope
+    return run_block(compile_program(code, file), scope, file)
+
 # ==================== WEB SERVER ====================
+@functools.lru_cache(maxsize=1)
 def get_local_ip():
-    """Get local IP address"""
+    """Get local IP address, probing the network only on the first call"""
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.settimeout(0.1)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
+        # Connecting a UDP socket sends nothing; it only picks the route
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
         return "127.0.0.1"
 
+def run_route(path, query=None):
+    """Run a registered route in a fresh request scope and return its result"""
+    request_scope = Scope(parent=global_scope, name=f"request:{path}")
+    request_scope.set('request', {
+        'path': path,
+        'query': query if query is not None else {},
+        'method': 'GET'
+    })
+    return run_block(web_routes[path], request_scope, f"route:{path}")
+
+# Encoded 404 page and the number of routes it lists
+_not_found_page: Tuple[int, bytes] = (-1, b'')
+
+def not_found_page() -> bytes:
+    """Return the encoded 404 page, rendering it again only after routes change"""
+    global _not_found_page
+    count, body = _not_found_page
+    # Routes are only ever added or overwritten, so the count tells
+    # whether the list changed
+    if count != len(web_routes):
+        routes = ''.join(f'<li><a href="{r}">{r}</a></li>' for r in web_routes)
+        body = f"<h1>404</h1><ul>{routes}</ul>".encode('utf-8')
+        _not_found_page = (len(web_routes), body)
+    return body
+
 class ExoWebHandler(BaseHTTPRequestHandler):
     """HTTP request handler for EXO web server"""
+    # Body for routes that return nothing, encoded once
+    default_body: ClassVar[bytes] = "<!DOCTYPE html><html><body><h1>✅ EXO</h1></body></html>".encode('utf-8')
+
     def log_message(self, format, *args):
         print(f"[{time.strftime('%H:%M:%S')}] {format % args}")
     
+    def send_html(self, status, body, cors=False):
+        """Send an encoded HTML body with its status and headers"""
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if cors:
+            self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+    
     def do_GET(self):
-        global current_scope
         parsed = urlparse(self.path)
         path = parsed.path
         
@@ -1126,40 +1749,14 @@ class ExoWebHandler(BaseHTTPRequestHandler):
         
         if path in web_routes:
             try:
-                old_scope = current_scope
-                request_scope = Scope(parent=global_scope, name=f"request:{path}")
-                current_scope = request_scope
-                current_scope.set('request', {
-                    'path': path,
-                    'query': parse_qs(parsed.query),
-                    'method': 'GET'
-                })
-                
-                try:
-                    result = run(web_routes[path], f"route:{path}")
-                finally:
-                    current_scope = old_scope
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                
-                if not result:
-                    result = "<!DOCTYPE html><html><body><h1>✅ EXO</h1></body></html>"
-                self.wfile.write(str(result).encode('utf-8'))
+                result = run_route(path, parse_qs(parsed.query))
+                body = str(result).encode('utf-8') if result else self.default_body
+                self.send_html(200, body, cors=True)
             
             except ExoError as e:
-                self.send_response(500)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(f"<pre>{e}</pre>".encode('utf-8'))
+                self.send_html(500, f"<pre>{e}</pre>".encode('utf-8'))
         else:
-            self.send_response(404)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            routes = ''.join(f'<li><a href="{r}">{r}</a></li>' for r in web_routes)
-            self.wfile.write(f"<h1>404</h1><ul>{routes}</ul>".encode('utf-8'))
+            self.send_html(404, not_found_page())
 
 def start_web_server(port=8000):
     """Start the web server"""
@@ -1169,7 +1766,7 @@ def start_web_server(port=8000):
         return
     
     try:
-        httpd = HTTPServer(('0.0.0.0', port), ExoWebHandler)
+        httpd = ThreadingHTTPServer(('0.0.0.0', port), ExoWebHandler)
         ip = get_local_ip()
         print(f"✅ Server running at http://{ip}:{port}/\n")
         print("📌 Available routes:")
@@ -1186,8 +1783,7 @@ def start_web_server(port=8000):
 def run_file(filepath):
     """Execute an EXO file"""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            code = f.read()
+        code = read_source(filepath)
         print(f"🚀 Running: {filepath}\n")
         start = time.time()
         run(code, filepath)
@@ -1208,14 +1804,16 @@ def run_file(filepath):
         sys.exit(1)
 
 # ==================== REPL ====================
-def repl():
+def repl() -> None:
     """Interactive REPL with multi-line support"""
     print("=" * 50)
     print("🌟 EXO Interactive Mode v3.1")
     print("=" * 50)
     print("Type 'exit' to quit | 'help' for help\n")
     
-    buffer = []
+    buffer: List[str] = []
+    # Blocks still open in buffer, updated as each line comes in
+    depth: int = 0
     
     while True:
         try:
@@ -1226,7 +1824,7 @@ def repl():
             if line in ('exit', 'خروج', 'quit'):
                 if buffer:
                     print("⚠ Incomplete commands")
-                    buffer = []
+                    buffer, depth = [], 0
                     continue
                 print("👋 Goodbye!")
                 break
@@ -1235,7 +1833,7 @@ def repl():
             if line in ('clear', 'مسح'):
                 global_scope.vars.clear()
                 functions.clear()
-                buffer = []
+                buffer, depth = [], 0
                 print("✅ Cleared")
                 continue
             
@@ -1283,39 +1881,30 @@ def repl():
             if line:
                 buffer.append(line)
                 
-                # Check if multi-line block
-                if line.startswith(('func ', 'دالة ', 'if ', 'اذا ', 'while ', 'بينما ', 'for ', 'لكل ')):
-                    if not line.endswith(('end', 'نهاية')):
-                        continue
-                
-                # Check block depth
-                if buffer:
-                    depth = 0
-                    for l in buffer:
-                        l = l.strip()
-                        if l.startswith(('func ', 'دالة ', 'if ', 'اذا ', 'while ', 'بينما ', 'for ', 'لكل ')):
-                            depth += 1
-                        if l in ('end', 'نهاية'):
-                            depth -= 1
-                    
-                    if depth > 0:
-                        continue
+                # Wait for the 'end' of every block opened so far, and for
+                # the function an @memo line annotates
+                if opens_block(line):
+                    depth += 1
+                elif line in END_KEYWORDS:
+                    depth -= 1
+                if depth > 0 or line in MEMO_MARKERS:
+                    continue
                 
                 # Execute buffer
                 try:
                     result = run('\n'.join(buffer))
-                    if result is not None and result not in ('break', 'continue'):
+                    if result is not None:
                         print(f"=> {result}")
                 except ExoError:
                     pass
                 except Exception as e:
                     print(f"❌ {e}")
                 
-                buffer = []
+                buffer, depth = [], 0
         
         except KeyboardInterrupt:
             print("\nPress Ctrl+C again or type 'exit'")
-            buffer = []
+            buffer, depth = [], 0
         except EOFError:
             print("\n👋 Goodbye!")
             break
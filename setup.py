@@ -1,14 +1,29 @@
+import os
 from setuptools import setup
 
+# Optional native build of the interpreter with mypyc:
+#   EXO_MYPYC=1 pip install .
+# Without it the same source runs as plain Python. Check either build with
+#   python tests/run_regress.py [directory holding the compiled main]
+# The interpreter is the top-level module main, compiled or not, and the exo
+# command runs its main()
+py_modules = ['main']
+ext_modules = []
+if os.environ.get('EXO_MYPYC'):
+    from mypyc.build import mypycify
+    py_modules = []
+    ext_modules = mypycify(['main.py'])
+
 setup(
     name='exo-lang',
     version='3.1.0',
     description='لغة برمجية عربية/إنجليزية',
     author='BADR',
-    py_modules=['exo'],
+    py_modules=py_modules,
+    ext_modules=ext_modules,
     entry_points={
         'console_scripts': [
-            'exo=exo:main',
+            'exo=main:main',
         ],
     },
     classifiers=[
@@ -0,0 +1,97 @@
+"""Run the EXO regression programs and compare their output
+
+Each tests/regress/NAME.exo runs in its own interpreter process and its
+stdout must match NAME.out. NAME.in, when present, is its stdin for
+input(). An uncaught ExoError prints as one "ERR <message> line=<n>" line,
+so error programs are checked too. Routes the program registers are then
+requested once each, in order. Programs run from tests/regress, so files
+they write or delete are relative to it.
+
+    python tests/run_regress.py              # check against main.py
+    python tests/run_regress.py build/lib    # check a mypyc build directory
+    python tests/run_regress.py --record     # rewrite the .out files
+"""
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REGRESS_DIR = os.path.join(HERE, 'regress')
+DEFAULT_MODULE = os.path.join(os.path.dirname(HERE), 'main.py')
+
+# Loads the interpreter from a main.py file, or from a directory holding a
+# compiled main extension, then runs one program file
+DRIVER = '''
+import importlib, importlib.util, os, sys
+target, path = sys.argv[1], sys.argv[2]
+if os.path.isdir(target):
+    sys.path.insert(0, target)
+    exo = importlib.import_module("main")
+else:
+    spec = importlib.util.spec_from_file_location("exo_main", target)
+    exo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(exo)
+try:
+    with open(path, encoding="utf-8") as f:
+        code = f.read()
+    exo.run(code, path)
+except exo.ExoError as e:
+    print("ERR", e.msg, "line=%s" % e.line)
+for route in list(exo.web_routes):
+    try:
+        print("GET", route, "=>", exo.run_route(route))
+    except exo.ExoError as e:
+        print("GET", route, "ERR", e.msg, "line=%s" % e.line)
+'''
+
+def run_program(module, path):
+    """Run one .exo file and return what it printed"""
+    try:
+        with open(path[:-4] + '.in', encoding='utf-8') as f:
+            stdin = f.read()
+    except FileNotFoundError:
+        stdin = ''
+    proc = subprocess.run([sys.executable, '-c', DRIVER, module, path],
+                          input=stdin, capture_output=True, text=True,
+                          encoding='utf-8', timeout=120, cwd=REGRESS_DIR)
+    if proc.returncode:
+        return proc.stdout + "CRASH\n" + proc.stderr
+    return proc.stdout
+
+def main(argv):
+    record = '--record' in argv
+    args = [a for a in argv if a != '--record']
+    module = os.path.abspath(args[0]) if args else DEFAULT_MODULE
+
+    names = sorted(n[:-4] for n in os.listdir(REGRESS_DIR) if n.endswith('.exo'))
+    failures = 0
+    for name in names:
+        got = run_program(module, os.path.join(REGRESS_DIR, name + '.exo'))
+        expected_path = os.path.join(REGRESS_DIR, name + '.out')
+
+        if record:
+            with open(expected_path, 'w', encoding='utf-8') as f:
+                f.write(got)
+            continue
+
+        try:
+            with open(expected_path, encoding='utf-8') as f:
+                expected = f.read()
+        except FileNotFoundError:
+            expected = None
+        if got != expected:
+            failures += 1
+            print(f"FAIL {name}")
+            print("--- expected")
+            print(expected if expected is not None else "(no .out file)")
+            print("--- got")
+            print(got)
+
+    if record:
+        print(f"Recorded {len(names)} programs")
+        return 0
+    print(f"{len(names) - failures}/{len(names)} passed")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))